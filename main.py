@@ -1,13 +1,26 @@
 import streamlit as st
 import sqlite3
 import pandas as pd
+import numpy as np
 import requests
 import re
 import time
 import os
+import threading
+import atexit
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from youtube_transcript_api import YouTubeTranscriptApi
+from youtube_transcript_api import YouTubeTranscriptApi, TooManyRequests, YouTubeRequestFailed
 from urllib.parse import urlparse, parse_qs
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential_jitter
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+try:
+    from numba import njit
+except ImportError:  # numba가 없으면 NumPy 구현으로 글자 수를 셈
+    njit = None
 
 # 페이지 설정
 st.set_page_config(
@@ -16,15 +29,130 @@ st.set_page_config(
     layout="wide"
 )
 
+# 히라가나/가타카나/한자 범위 (pandas의 pyarrow 정규식은 \u 이스케이프를 지원하지 않아 실제 문자로 둠)
+_JPN_CHARS = '\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FAF'
+
+# 한국어 → 영어 → 일본어 순으로 검사
+_SPEAKER_PATTERNS = (
+    r'^(?P<ko_colon>[가-힣]{2,4})\s*:',
+    r'^\((?P<ko_paren>[가-힣]{2,4})\)',
+    r'^【(?P<ko_bracket>[가-힣]{2,4})】',
+    r'^(?P<en_full_colon>[A-Z][a-z]+ [A-Z][a-z]+)\s*:',
+    r'^(?P<en_colon>[A-Z][a-z]+)\s*:',
+    r'^\((?P<en_paren>[A-Z][a-z]+)\)',
+    r'^(?P<ja_colon>[' + _JPN_CHARS + r']{2,8})\s*:',
+    r'^\((?P<ja_paren>[' + _JPN_CHARS + r']{2,8})\)'
+)
+# 위 패턴을 같은 순서로 합쳐 한 번의 extract로 검사 (앞쪽 패턴이 우선), 나머지 본문은 rest 그룹으로 함께 잡음
+_SPEAKER_SPLIT_RE = re.compile('(?s)(?:' + '|'.join(_SPEAKER_PATTERNS) + ')(?P<rest>.*)')
+
+_DEFAULT_SPEAKERS = {
+    'korean': "화자",
+    'english': "Speaker", 
+    'japanese': "話者",
+    'mixed': "Speaker"
+}
+
+# 다시 시도하면 성공할 수 있는 HTTP 상태 코드 (요청 과다, 서버 오류)
+_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# 검색 언어 필터 선택지와 표시 이름 (검색 fragment 재실행 때는 새로 만들지 않고 그대로 사용)
+_LANGUAGE_LABELS = {
+    "all": "전체", 
+    "korean": "한국어", 
+    "english": "영어", 
+    "japanese": "일본어",
+    "mixed": "혼합"
+}
+_LANGUAGE_OPTIONS = tuple(_LANGUAGE_LABELS)
+
+def count_scripts(codepoints, offsets):
+    # offsets로 나뉜 자막별 (한국어, 영어, 일본어, 공백 제외 전체) 글자 수
+    korean = (codepoints >= 0xAC00) & (codepoints <= 0xD7A3)
+    english = ((codepoints >= 0x41) & (codepoints <= 0x5A)) | ((codepoints >= 0x61) & (codepoints <= 0x7A))
+    japanese = ((codepoints >= 0x3040) & (codepoints <= 0x30FF)) | ((codepoints >= 0x4E00) & (codepoints <= 0x9FAF))
+    non_space = codepoints != 0x20
+    
+    masks = np.stack([korean, english, japanese, non_space], axis=1).astype(np.int64)
+    cumulative = np.vstack([np.zeros((1, 4), dtype=np.int64), masks.cumsum(axis=0)])
+    return cumulative[offsets[1:]] - cumulative[offsets[:-1]]
+
+def count_scripts_loop(codepoints, offsets):
+    # count_scripts와 같은 결과를 내는 단일 루프 버전 (numba JIT 대상)
+    counts = np.zeros((len(offsets) - 1, 4), dtype=np.int64)
+    for i in range(len(offsets) - 1):
+        for k in range(offsets[i], offsets[i + 1]):
+            cp = codepoints[k]
+            if cp == 0x20:
+                continue
+            counts[i, 3] += 1
+            if 0xAC00 <= cp <= 0xD7A3:
+                counts[i, 0] += 1
+            elif (0x3040 <= cp <= 0x30FF) or (0x4E00 <= cp <= 0x9FAF):
+                counts[i, 2] += 1
+            elif (0x41 <= cp <= 0x5A) or (0x61 <= cp <= 0x7A):
+                counts[i, 1] += 1
+    return counts
+
 class YouTubeClipFinder:
+    # 검색 조건({conditions})은 고정된 조각으로만 조립하므로 SQL 텍스트 종류가 적어 prepared statement 캐시가 재사용됨
+    # bm25 관련도 상위 LIMIT개를 고른 뒤, 화면에는 영상/시간 순으로 보여줌 (재생 링크도 SQL에서 만듦)
+    _SEARCH_SQL = """
+        SELECT * FROM (
+            SELECT c.video_id, c.title, c.channel_name, c.speaker, c.text, c.start_time, c.end_time, c.duration, c.language,
+                'https://www.youtube.com/watch?v=' || c.video_id || '&t=' || c.start_time || 's' AS url
+            FROM captions_fts
+            JOIN captions c ON c.id = captions_fts.rowid
+            WHERE captions_fts MATCH ?
+            {conditions}
+            ORDER BY bm25(captions_fts)
+            LIMIT ?
+        )
+        ORDER BY video_id, start_time
+    """
+    
+    # 검색어가 모두 2글자 이하라 trigram 인덱스를 쓸 수 없을 때의 LIKE 스캔
+    _SEARCH_SCAN_SQL = """
+        SELECT c.video_id, c.title, c.channel_name, c.speaker, c.text, c.start_time, c.end_time, c.duration, c.language,
+            'https://www.youtube.com/watch?v=' || c.video_id || '&t=' || c.start_time || 's' AS url
+        FROM captions c
+        WHERE 1
+        {conditions}
+        ORDER BY c.video_id, c.start_time
+        LIMIT ?
+    """
+    
+    _RESULT_COLUMNS = [
+        'video_id', 'title', 'channel_name', 'speaker', 'text',
+        'start_time', 'end_time', 'duration', 'language', 'url'
+    ]
+    
+    # video_info 캐시 유효 기간 (SQLite datetime 수정자, 지나면 다시 조회해 제목 변경을 반영)
+    _VIDEO_INFO_MAX_AGE = '-1 day'
+    
     def __init__(self, api_key=None):
         self.api_key = api_key
         self.db_path = "user_captions.db"
+        # 재실행 간에 재사용하는 연결 (수집 스레드와 공유하므로 lock으로 보호)
+        self.conn = self._connect()
+        self.lock = threading.Lock()
+        # 종료 시 닫아 WAL 체크포인트가 정상적으로 수행되게 함
+        atexit.register(self.conn.close)
         self.init_database()
     
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        
+        # WAL + NORMAL: 커밋마다 fsync하지 않고, 쓰는 동안에도 읽기가 막히지 않음
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute('PRAGMA cache_size=-65536')
+        conn.execute('PRAGMA mmap_size=268435456')
+        return conn
+    
     def init_database(self):
-        conn = sqlite3.connect(self.db_path)
-        cur = conn.cursor()
+        cur = self.conn.cursor()
         
         cur.execute('''
             CREATE TABLE IF NOT EXISTS captions (
@@ -43,13 +171,133 @@ class YouTubeClipFinder:
             )
         ''')
         
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_speaker ON captions(speaker)')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_text ON captions(text)')
-        cur.execute('CREATE INDEX IF NOT EXISTS idx_video_id ON captions(video_id)')
+        # speaker/text 검색은 FTS5, 통계는 caption_counts가 맡으므로 단일 컬럼 인덱스는 쓰기 비용만 늘림
+        cur.execute('DROP INDEX IF EXISTS idx_speaker')
+        cur.execute('DROP INDEX IF EXISTS idx_text')
+        # (video_id, start_time) 조회/정렬은 UNIQUE 제약의 자동 인덱스가 담당
+        cur.execute('DROP INDEX IF EXISTS idx_video_id')
         cur.execute('CREATE INDEX IF NOT EXISTS idx_language ON captions(language)')
         
-        conn.commit()
-        conn.close()
+        # 영상 제목/채널명은 거의 바뀌지 않으므로 세션을 넘어 재사용
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS video_info (
+                video_id TEXT PRIMARY KEY,
+                title TEXT,
+                channel_name TEXT,
+                fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # text/speaker 부분 문자열 검색용 FTS5 trigram 인덱스 (captions 테이블을 content로 사용)
+        fts_sql = cur.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'captions_fts'"
+        ).fetchone()
+        
+        # 예전 unicode61 인덱스는 띄어쓰기 없는 한국어/일본어 중간 글자를 찾지 못하므로 trigram으로 다시 만듦
+        if fts_sql and 'trigram' not in fts_sql[0]:
+            cur.execute('DROP TABLE captions_fts')
+            fts_sql = None
+        
+        cur.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS captions_fts USING fts5(
+                text,
+                speaker,
+                content='captions',
+                content_rowid='id',
+                tokenize='trigram'
+            )
+        ''')
+        
+        cur.execute('''
+            CREATE TRIGGER IF NOT EXISTS captions_ai AFTER INSERT ON captions BEGIN
+                INSERT INTO captions_fts(rowid, text, speaker)
+                VALUES (new.id, new.text, new.speaker);
+            END
+        ''')
+        cur.execute('''
+            CREATE TRIGGER IF NOT EXISTS captions_ad AFTER DELETE ON captions BEGIN
+                INSERT INTO captions_fts(captions_fts, rowid, text, speaker)
+                VALUES ('delete', old.id, old.text, old.speaker);
+            END
+        ''')
+        cur.execute('''
+            CREATE TRIGGER IF NOT EXISTS captions_au AFTER UPDATE ON captions BEGIN
+                INSERT INTO captions_fts(captions_fts, rowid, text, speaker)
+                VALUES ('delete', old.id, old.text, old.speaker);
+                INSERT INTO captions_fts(rowid, text, speaker)
+                VALUES (new.id, new.text, new.speaker);
+            END
+        ''')
+        
+        # 기존 DB는 최초 한 번만 인덱스를 채움
+        if not fts_sql:
+            cur.execute("INSERT INTO captions_fts(captions_fts) VALUES('rebuild')")
+        
+        # 통계용 집계 테이블: 트리거로 언어/영상/화자별 자막 수를 유지해 COUNT(DISTINCT) 전체 스캔을 피함
+        # (언어가 NULL인 행은 ''로 묶어 두고 읽을 때 NULL로 되돌림)
+        counts_exists = cur.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'caption_counts'"
+        ).fetchone()
+        
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS caption_counts (
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (kind, key)
+            )
+        ''')
+        
+        cur.execute('''
+            CREATE TRIGGER IF NOT EXISTS caption_counts_ai AFTER INSERT ON captions BEGIN
+                INSERT INTO caption_counts(kind, key, count)
+                SELECT 'language', IFNULL(new.language, ''), 1
+                UNION ALL SELECT 'video', new.video_id, 1
+                UNION ALL SELECT 'speaker', new.speaker, 1 WHERE new.speaker IS NOT NULL
+                ON CONFLICT(kind, key) DO UPDATE SET count = count + 1;
+            END
+        ''')
+        cur.execute('''
+            CREATE TRIGGER IF NOT EXISTS caption_counts_ad AFTER DELETE ON captions BEGIN
+                UPDATE caption_counts SET count = count - 1
+                WHERE (kind = 'language' AND key = IFNULL(old.language, ''))
+                OR (kind = 'video' AND key = old.video_id)
+                OR (kind = 'speaker' AND key = old.speaker);
+                DELETE FROM caption_counts WHERE count <= 0;
+            END
+        ''')
+        cur.execute('''
+            CREATE TRIGGER IF NOT EXISTS caption_counts_au AFTER UPDATE OF video_id, speaker, language ON captions BEGIN
+                UPDATE caption_counts SET count = count - 1
+                WHERE (kind = 'language' AND key = IFNULL(old.language, ''))
+                OR (kind = 'video' AND key = old.video_id)
+                OR (kind = 'speaker' AND key = old.speaker);
+                DELETE FROM caption_counts WHERE count <= 0;
+                INSERT INTO caption_counts(kind, key, count)
+                SELECT 'language', IFNULL(new.language, ''), 1
+                UNION ALL SELECT 'video', new.video_id, 1
+                UNION ALL SELECT 'speaker', new.speaker, 1 WHERE new.speaker IS NOT NULL
+                ON CONFLICT(kind, key) DO UPDATE SET count = count + 1;
+            END
+        ''')
+        
+        # 기존 DB는 최초 한 번만 집계를 채움
+        if not counts_exists:
+            cur.execute('''
+                INSERT INTO caption_counts(kind, key, count)
+                SELECT 'language', IFNULL(language, ''), COUNT(*) FROM captions GROUP BY language
+                UNION ALL SELECT 'video', video_id, COUNT(*) FROM captions GROUP BY video_id
+                UNION ALL SELECT 'speaker', speaker, COUNT(*) FROM captions WHERE speaker IS NOT NULL GROUP BY speaker
+            ''')
+        
+        # 통계가 한 번도 수집되지 않은 DB는 쿼리 플래너용 통계를 한 번 만들어 둠 (이후는 PRAGMA optimize가 갱신)
+        stat_exists = cur.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+        ).fetchone()
+        if not stat_exists:
+            cur.execute('ANALYZE captions')
+        
+        self.conn.commit()
     
     def extract_video_id(self, url):
         if "youtube.com/watch" in url:
@@ -60,215 +308,233 @@ class YouTubeClipFinder:
             return url
     
     def get_video_info_oembed(self, video_id):
+        with self.lock:
+            cached = self.conn.execute(
+                "SELECT title, channel_name, fetched_at >= datetime('now', ?) FROM video_info WHERE video_id = ?",
+                (self._VIDEO_INFO_MAX_AGE, video_id)
+            ).fetchone()
+        
+        if cached and cached[2]:
+            return {'title': cached[0], 'channel_name': cached[1]}
+        
         try:
-            url = f"https://www.youtube.com/oembed?url=https://www.youtube.com/watch?v={video_id}&format=json"
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            return {
-                'title': data.get('title', 'Unknown Title'),
-                'channel_name': data.get('author_name', 'Unknown Channel')
-            }
+            video_info = fetch_video_info_oembed(video_id)
         except:
+            # 갱신에 실패하면 오래된 캐시라도 fallback보다 나으므로 그대로 사용
+            if cached:
+                return {'title': cached[0], 'channel_name': cached[1]}
             return {
                 'title': f'Video {video_id}', 
                 'channel_name': 'Unknown Channel'
             }
+        
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO video_info (video_id, title, channel_name) VALUES (?, ?, ?)",
+                (video_id, video_info['title'], video_info['channel_name'])
+            )
+        
+        return video_info
     
-    def detect_language(self, text):
-        korean_chars = len(re.findall(r'[가-힣]', text))
-        english_chars = len(re.findall(r'[a-zA-Z]', text))
-        japanese_chars = len(re.findall(r'[ひらがなカタカナ]|[\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FAF]', text))
-        total_chars = len(text.replace(' ', ''))
-        
-        if total_chars == 0:
-            return 'unknown'
-        
-        korean_ratio = korean_chars / total_chars
-        english_ratio = english_chars / total_chars
-        japanese_ratio = japanese_chars / total_chars
-        
-        if korean_ratio > 0.3:
-            return 'korean'
-        elif japanese_ratio > 0.3:
-            return 'japanese'
-        elif english_ratio > 0.5:
-            return 'english'
-        else:
-            return 'mixed'
+    def get_video_info_bulk(self, video_ids, api_key):
+        # Data API videos.list는 요청당 ID를 50개까지 받으므로 묶어서 조회 후 video_info 캐시에 저장
+        video_infos = {}
+        for i in range(0, len(video_ids), 50):
+            try:
+                video_infos.update(fetch_video_info_api(video_ids[i:i + 50], api_key))
+            except Exception:
+                # 실패한 묶음은 수집할 때 oEmbed로 하나씩 조회됨
+                continue
+        
+        if video_infos:
+            with self.lock, self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO video_info (video_id, title, channel_name) VALUES (?, ?, ?)",
+                    [(video_id, info['title'], info['channel_name']) for video_id, info in video_infos.items()]
+                )
+        
+        return video_infos
     
-    def detect_speaker(self, text, previous_speaker=None, language='unknown'):
-        text = text.strip()
-        
-        korean_patterns = [
-            r'^([가-힣]{2,4})\s*:',
-            r'^\(([가-힣]{2,4})\)',
-            r'^【([가-힣]{2,4})】'
-        ]
-        
-        english_patterns = [
-            r'^([A-Z][a-z]+ [A-Z][a-z]+)\s*:',
-            r'^([A-Z][a-z]+)\s*:',
-            r'^\(([A-Z][a-z]+)\)'
-        ]
-        
-        japanese_patterns = [
-            r'^([\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FAF]{2,8})\s*:',
-            r'^\(([\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FAF]{2,8})\)'
-        ]
-        
-        all_patterns = korean_patterns + english_patterns + japanese_patterns
-        
-        for pattern in all_patterns:
-            match = re.match(pattern, text)
-            if match:
-                return match.group(1), re.sub(pattern, '', text).strip()
-        
-        default_speakers = {
-            'korean': "화자",
-            'english': "Speaker", 
-            'japanese': "話者",
-            'mixed': "Speaker"
-        }
+    def detect_languages(self, texts):
+        # 공백 제외 글자 중 한국어 30% / 일본어 30% / 영어 50% 초과 순으로 판정 (같은 문장은 한 번만 계산)
+        codes, unique_texts = pd.factorize(texts)
+        
+        # 모든 자막을 하나의 코드포인트 배열로 이어 붙여 한 번에 셈
+        lengths = np.fromiter(map(len, unique_texts), dtype=np.int64, count=len(unique_texts))
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        codepoints = np.frombuffer(
+            ''.join(unique_texts).encode('utf-32-le', 'surrogatepass'), dtype=np.uint32
+        )
+        korean_chars, english_chars, japanese_chars, total_chars = get_script_counter()(codepoints, offsets).T
+        ratio_base = np.maximum(total_chars, 1)
+        
+        languages = np.select(
+            [
+                total_chars == 0,
+                korean_chars / ratio_base > 0.3,
+                japanese_chars / ratio_base > 0.3,
+                english_chars / ratio_base > 0.5
+            ],
+            ['unknown', 'korean', 'japanese', 'english'],
+            default='mixed'
+        )
+        return pd.Series(languages[codes], index=texts.index)
+    
+    def detect_speakers(self, texts, languages, previous_speaker=None):
+        # 줄 앞의 화자 표기를 떼어 내고, 화자 표기가 없는 줄은 직전 화자를 이어받음
+        codes, unique_texts = pd.factorize(texts)
+        unique_texts = pd.Series(unique_texts)
+        
+        # 정규식 한 번으로 화자와 나머지 본문을 같이 추출 (본문을 다시 치환하지 않음)
+        extracted = unique_texts.str.extract(_SPEAKER_SPLIT_RE)
+        matched = extracted.drop(columns='rest').bfill(axis=1).iloc[:, 0]
+        clean_texts = extracted['rest'].str.strip().fillna(unique_texts)
         
-        return previous_speaker or default_speakers.get(language, "Speaker"), text
+        if not previous_speaker and len(languages):
+            previous_speaker = _DEFAULT_SPEAKERS.get(languages.iloc[0], "Speaker")
+        
+        speakers = pd.Series(matched.to_numpy()[codes], index=texts.index)
+        clean_texts = pd.Series(clean_texts.to_numpy()[codes], index=texts.index)
+        return speakers.ffill().fillna(previous_speaker), clean_texts
     
     def collect_subtitles(self, video_url):
         try:
             video_id = self.extract_video_id(video_url)
             
-            conn = sqlite3.connect(self.db_path)
-            cur = conn.cursor()
-            existing = cur.execute(
-                "SELECT COUNT(*) FROM captions WHERE video_id = ?", 
-                (video_id,)
-            ).fetchone()[0]
+            # 영상별 자막 수는 caption_counts에 있으므로 기본키 조회 한 번으로 수집 여부와 개수를 함께 얻음
+            with self.lock:
+                existing = self.conn.execute(
+                    "SELECT count FROM caption_counts WHERE kind = 'video' AND key = ?", 
+                    (video_id,)
+                ).fetchone()
             
-            if existing > 0:
-                conn.close()
-                return f"이미 수집된 영상: {existing}개 자막 존재"
+            if existing:
+                return f"이미 수집된 영상: {existing[0]}개 자막 존재"
             
             try:
-                transcript = YouTubeTranscriptApi.get_transcript(
-                    video_id, 
-                    languages=['ko', 'ko-KR', 'ja', 'ja-JP', 'en', 'en-US', 'en-GB', 'auto']
-                )
+                transcript = fetch_transcript(video_id)
             except Exception as e:
-                conn.close()
                 return f"자막 없음: {str(e)}"
             
             video_info = self.get_video_info_oembed(video_id)
             
-            current_speaker = video_info['channel_name']
-            saved_count = 0
+            df = pd.DataFrame(transcript, columns=['text', 'start', 'duration'])
+            df['text'] = df['text'].str.strip()
+            df = df[df['text'].str.len() >= 2].copy()
             
-            for item in transcript:
-                text = item['text'].strip()
-                if not text or len(text) < 2:
-                    continue
-                
-                start_time = int(item['start'])
-                duration = item['duration']
-                end_time = int(start_time + duration)
-                
-                language = self.detect_language(text)
-                detected_speaker, clean_text = self.detect_speaker(text, current_speaker, language)
-                current_speaker = detected_speaker
-                
-                try:
-                    cur.execute('''
-                        INSERT OR IGNORE INTO captions 
-                        (video_id, title, channel_name, speaker, text, start_time, end_time, duration, language)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        video_id, 
-                        video_info['title'],
-                        video_info['channel_name'],
-                        detected_speaker,
-                        clean_text,
-                        start_time,
-                        end_time,
-                        duration,
-                        language
-                    ))
-                    saved_count += 1
-                except:
-                    pass
+            df['start_time'] = df['start'].astype(int)
+            df['end_time'] = (df['start_time'] + df['duration']).astype(int)
+            df['language'] = self.detect_languages(df['text'])
+            df['speaker'], df['text'] = self.detect_speakers(
+                df['text'], df['language'], video_info['channel_name']
+            )
+            
+            # 같은 초에 시작하는 자막은 UNIQUE 제약에 걸리므로 INSERT 전에 걸러냄
+            df = df.drop_duplicates('start_time')
             
-            conn.commit()
-            conn.close()
+            df['video_id'] = video_id
+            df['title'] = video_info['title']
+            df['channel_name'] = video_info['channel_name']
+            # 행 튜플을 리스트로 모으지 않고 executemany가 바로 소비하게 함
+            rows = df[[
+                'video_id', 'title', 'channel_name', 'speaker', 'text',
+                'start_time', 'end_time', 'duration', 'language'
+            ]].itertuples(index=False, name=None)
+            
+            with self.lock, self.conn:
+                # 쓰기 잠금을 처음부터 잡아 다른 프로세스와의 BUSY 승격 충돌을 피함
+                self.conn.execute('BEGIN IMMEDIATE')
+                cur = self.conn.executemany('''
+                    INSERT OR IGNORE INTO captions 
+                    (video_id, title, channel_name, speaker, text, start_time, end_time, duration, language)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', rows)
+            saved_count = cur.rowcount
+            
+            # 대량 입력 후 통계를 갱신해 쿼리 플래너가 인덱스를 제대로 고르게 함
+            with self.lock:
+                self.conn.execute('PRAGMA optimize')
             
             return f"수집 완료: {saved_count}개 자막 저장"
             
         except Exception as e:
             return f"오류: {str(e)}"
     
+    def fts_term(self, keyword):
+        # FTS5 문법 문자를 무력화한 구문 검색 (trigram에서는 자막 중간의 부분 문자열도 매칭)
+        return '"' + keyword.replace('"', '""') + '"'
+    
+    def db_mtime(self):
+        # 캐시 무효화 키: 자막을 수집하면 DB 파일(WAL 포함) 수정 시각이 바뀜
+        paths = [self.db_path, self.db_path + '-wal']
+        return max(os.path.getmtime(p) for p in paths if os.path.exists(p))
+    
     def search_captions(self, query, limit=50, language_filter=None):
-        conn = sqlite3.connect(self.db_path)
-        cur = conn.cursor()
-        
+        return cached_search_captions(self, self.db_mtime(), query, limit, language_filter)
+    
+    def query_captions(self, query, limit=50, language_filter=None):
         keywords = query.split()
+        if not keywords:
+            return pd.DataFrame(columns=self._RESULT_COLUMNS)
+        
+        # 두 단어 이상이면 첫 단어는 화자, 나머지는 자막 본문 / 한 단어면 본문이나 화자 어디든
+        if len(keywords) >= 2:
+            terms = [('speaker', keywords[0])] + [('text', keyword) for keyword in keywords[1:]]
+        else:
+            terms = [(None, keywords[0])]
+        
+        # trigram 인덱스는 3글자 이상만 찾을 수 있으므로 짧은 단어(정말, 田中 등)는 LIKE로 직접 거름
+        match_terms = []
+        conditions = []
+        condition_params = []
+        for column, keyword in terms:
+            if len(keyword) >= 3:
+                match_terms.append((f"{column}:" if column else "") + self.fts_term(keyword))
+            elif column:
+                conditions.append(f"AND c.{column} LIKE ?")
+                condition_params.append(f"%{keyword}%")
+            else:
+                conditions.append("AND (c.text LIKE ? OR c.speaker LIKE ?)")
+                condition_params.extend([f"%{keyword}%"] * 2)
         
-        language_condition = ""
         if language_filter and language_filter != "all":
-            language_condition = f" AND language = '{language_filter}'"
+            conditions.append("AND c.language = ?")
+            condition_params.append(language_filter)
         
-        if len(keywords) >= 2:
-            speaker_keyword = keywords[0]
-            text_keywords = keywords[1:]
-            
-            text_conditions = []
-            params = [f"%{speaker_keyword}%"]
-            
-            for keyword in text_keywords:
-                text_conditions.append("text LIKE ?")
-                params.append(f"%{keyword}%")
-            
-            text_condition_str = " AND ".join(text_conditions)
-            
-            sql = f"""
-                SELECT video_id, title, channel_name, speaker, text, start_time, end_time, duration, language
-                FROM captions 
-                WHERE speaker LIKE ?
-                AND {text_condition_str}
-                {language_condition}
-                ORDER BY video_id, start_time
-                LIMIT {limit}
-            """
-            
-            results = cur.execute(sql, params).fetchall()
+        if match_terms:
+            sql = self._SEARCH_SQL.format(conditions="\n".join(conditions))
+            params = (" AND ".join(match_terms), *condition_params, limit)
         else:
-            sql = f"""
-                SELECT video_id, title, channel_name, speaker, text, start_time, end_time, duration, language
-                FROM captions 
-                WHERE (text LIKE ? OR speaker LIKE ?)
-                {language_condition}
-                ORDER BY video_id, start_time
-                LIMIT {limit}
-            """
-            keyword_pattern = f"%{query}%"
-            results = cur.execute(sql, (keyword_pattern, keyword_pattern)).fetchall()
-        
-        conn.close()
+            sql = self._SEARCH_SCAN_SQL.format(conditions="\n".join(conditions))
+            params = (*condition_params, limit)
+        
+        # 결과를 튜플 리스트 대신 DataFrame으로 바로 받아 화면에서 그대로 사용
+        with self.lock:
+            results = pd.read_sql_query(sql, self.conn, params=params)
+        
         return results
     
     def get_stats(self):
-        conn = sqlite3.connect(self.db_path)
-        cur = conn.cursor()
-        
-        total_captions = cur.execute("SELECT COUNT(*) FROM captions").fetchone()[0]
-        total_videos = cur.execute("SELECT COUNT(DISTINCT video_id) FROM captions").fetchone()[0]
-        total_speakers = cur.execute("SELECT COUNT(DISTINCT speaker) FROM captions").fetchone()[0]
-        
-        lang_stats = cur.execute("""
-            SELECT language, COUNT(*) as count 
-            FROM captions 
-            GROUP BY language 
-            ORDER BY count DESC
-        """).fetchall()
-        
-        conn.close()
+        return cached_stats(self, self.db_mtime())
+    
+    def query_stats(self):
+        with self.lock:
+            cur = self.conn.cursor()
+            
+            # captions 대신 트리거로 유지되는 caption_counts만 읽음
+            total_captions, total_videos, total_speakers = cur.execute("""
+                SELECT
+                    (SELECT IFNULL(SUM(count), 0) FROM caption_counts WHERE kind = 'language'),
+                    (SELECT COUNT(*) FROM caption_counts WHERE kind = 'video'),
+                    (SELECT COUNT(*) FROM caption_counts WHERE kind = 'speaker')
+            """).fetchone()
+            
+            lang_stats = cur.execute("""
+                SELECT NULLIF(key, ''), count 
+                FROM caption_counts 
+                WHERE kind = 'language'
+                ORDER BY count DESC
+            """).fetchall()
         
         return {
             'total_captions': total_captions,
@@ -277,9 +543,100 @@ class YouTubeClipFinder:
             'languages': dict(lang_stats)
         }
 
-# 세션 상태 초기화
-if 'finder' not in st.session_state:
-    st.session_state.finder = YouTubeClipFinder()
+@st.cache_resource
+def get_finder():
+    return YouTubeClipFinder()
+
+@st.cache_resource
+def get_http_session():
+    # keep-alive 연결 풀 + 429/5xx 재시도 (Retry-After 헤더 존중)
+    session = requests.Session()
+    session.headers.update({'User-Agent': 'korean-clip-finder/1.0'})
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=_RETRY_STATUSES)
+    # oEmbed(youtube.com)와 Data API(googleapis.com) 호스트별로 풀을 따로 유지
+    session.mount('https://', HTTPAdapter(pool_connections=8, pool_maxsize=16, max_retries=retry))
+    return session
+
+@st.cache_resource(show_spinner=False)
+def get_script_counter():
+    if njit is None:
+        return count_scripts
+    
+    # 디스크 캐시(cache=True)는 main 모듈을 다시 import해 스크립트 전체가 재실행되므로 쓰지 않음
+    counter = njit(count_scripts_loop)
+    # 한 번 호출해 컴파일까지 끝내 둠 (프로세스당 한 번)
+    counter(np.zeros(1, dtype=np.uint32), np.array([0, 1], dtype=np.int64))
+    return counter
+
+@st.cache_data(ttl=300, show_spinner=False)
+def cached_search_captions(_finder, db_mtime, query, limit, language_filter):
+    return _finder.query_captions(query, limit, language_filter)
+
+@st.cache_data(ttl=300, show_spinner=False)
+def cached_stats(_finder, db_mtime):
+    return _finder.query_stats()
+
+def is_transient_error(error):
+    # YouTubeRequestFailed는 403/404 같은 영구 오류도 감싸므로, 원래 HTTPError의 상태 코드로 구분
+    if isinstance(error, YouTubeRequestFailed):
+        http_error = error.__context__
+        return (
+            isinstance(http_error, requests.exceptions.HTTPError)
+            and http_error.response is not None
+            and http_error.response.status_code in _RETRY_STATUSES
+        )
+    
+    return isinstance(error, (
+        TooManyRequests,
+        requests.exceptions.ConnectionError,
+        requests.exceptions.Timeout
+    ))
+
+# 일시적인 차단(429)/서버 오류(5xx)/네트워크 오류만 지수 백오프 + jitter로 재시도
+@retry(
+    wait=wait_exponential_jitter(initial=1, max=30),
+    stop=stop_after_attempt(5),
+    retry=retry_if_exception(is_transient_error),
+    reraise=True
+)
+def fetch_transcript(video_id):
+    return YouTubeTranscriptApi.get_transcript(
+        video_id, 
+        languages=['ko', 'ko-KR', 'ja', 'ja-JP', 'en', 'en-US', 'en-GB', 'auto']
+    )
+
+def fetch_video_info_oembed(video_id):
+    # 캐시는 video_info 테이블이 맡으므로 항상 새로 조회 (실패 시 예외를 올려 fallback 값이 저장되지 않게 함)
+    url = f"https://www.youtube.com/oembed?url=https://www.youtube.com/watch?v={video_id}&format=json"
+    response = get_http_session().get(url, timeout=10)
+    response.raise_for_status()
+    
+    data = response.json()
+    return {
+        'title': data.get('title', 'Unknown Title'),
+        'channel_name': data.get('author_name', 'Unknown Channel')
+    }
+
+def fetch_video_info_api(video_ids, api_key):
+    # 여러 영상의 제목/채널명을 한 번의 요청으로 가져옴 (없는 ID는 결과에서 빠짐)
+    response = get_http_session().get(
+        "https://www.googleapis.com/youtube/v3/videos",
+        params={'part': 'snippet', 'id': ','.join(video_ids), 'key': api_key},
+        timeout=10
+    )
+    response.raise_for_status()
+    
+    return {
+        item['id']: {
+            'title': item['snippet'].get('title', 'Unknown Title'),
+            'channel_name': item['snippet'].get('channelTitle', 'Unknown Channel')
+        }
+        for item in response.json().get('items', [])
+    }
+
+finder = get_finder()
+# 첫 수집 때 작업 스레드가 JIT 컴파일을 기다리지 않도록 스크립트 스레드에서 미리 준비
+get_script_counter()
 
 # 메인 헤더
 st.title("🎬 Korean Clip Finder")
@@ -307,61 +664,97 @@ if st.sidebar.button("🚀 자막 수집 시작"):
     if video_urls.strip():
         urls = [url.strip() for url in video_urls.strip().split('\n') if url.strip()]
         
-        for i, url in enumerate(urls):
-            result = st.session_state.finder.collect_subtitles(url)
-            st.sidebar.write(f"{i+1}. {result}")
+        # API 키가 있으면 영상 정보를 미리 한꺼번에 받아 URL별 oEmbed 요청을 생략
+        if api_key:
+            video_ids = []
+            for url in urls:
+                try:
+                    video_ids.append(finder.extract_video_id(url))
+                except KeyError:
+                    # v= 파라미터가 없는 URL은 건너뜀 (오류는 아래 URL별 수집 결과에 표시됨)
+                    continue
+            finder.get_video_info_bulk(list(dict.fromkeys(video_ids)), api_key)
+        
+        # 네트워크 대기가 대부분이므로 URL별 수집을 병렬로 실행
+        # 작업 스레드에 스크립트 컨텍스트를 붙여 st.cache_* 함수가 경고 없이 같은 캐시를 쓰게 함
+        with ThreadPoolExecutor(
+            max_workers=min(8, len(urls)),
+            initializer=add_script_run_ctx,
+            initargs=(None, get_script_run_ctx())
+        ) as executor:
+            futures = {
+                executor.submit(finder.collect_subtitles, url): i
+                for i, url in enumerate(urls)
+            }
+            progress_bar = st.sidebar.progress(0.0)
+            for done, future in enumerate(as_completed(futures), 1):
+                st.sidebar.write(f"{futures[future]+1}. {future.result()}")
+                progress_bar.progress(done / len(urls))
 
 # 통계
-stats = st.session_state.finder.get_stats()
-st.sidebar.subheader("📊 통계")
-st.sidebar.write(f"자막: {stats['total_captions']:,}개")
-st.sidebar.write(f"영상: {stats['total_videos']:,}개")
-st.sidebar.write(f"화자: {stats['total_speakers']:,}명")
-
-# 검색 인터페이스
-st.subheader("🔍 검색")
+@st.fragment
+def render_stats(finder):
+    st.subheader("📊 통계")
+    # st.expander 본문은 접혀 있어도 실행되므로, 토글을 켰을 때만 집계함
+    if st.toggle("통계 보기"):
+        stats = finder.get_stats()
+        st.write(f"자막: {stats['total_captions']:,}개")
+        st.write(f"영상: {stats['total_videos']:,}개")
+        st.write(f"화자: {stats['total_speakers']:,}명")
 
-col1, col2 = st.columns([3, 1])
-with col1:
-    search_query = st.text_input(
-        "",
-        placeholder="예: 유재석 정말, Trump great, 田中 面白い"
-    )
-
-with col2:
-    language_filter = st.selectbox(
-        "언어",
-        ["all", "korean", "english", "japanese", "mixed"],
-        format_func=lambda x: {
-            "all": "전체", 
-            "korean": "한국어", 
-            "english": "영어", 
-            "japanese": "일본어",
-            "mixed": "혼합"
-        }[x]
-    )
+with st.sidebar:
+    render_stats(finder)
 
-if st.button("🔍 검색"):
-    if search_query:
-        results = st.session_state.finder.search_captions(
-            search_query,
-            language_filter=language_filter if language_filter != "all" else None
+# 검색 인터페이스 (fragment로 감싸 검색 조작 시 이 영역만 다시 실행)
+@st.fragment
+def render_search(finder):
+    st.subheader("🔍 검색")
+    
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        search_query = st.text_input(
+            "",
+            placeholder="예: 유재석 정말, Trump great, 田中 面白い"
         )
-        
-        if results:
-            st.success(f"🎯 {len(results)}개 결과 발견!")
+    
+    with col2:
+        language_filter = st.selectbox(
+            "언어",
+            _LANGUAGE_OPTIONS,
+            format_func=_LANGUAGE_LABELS.__getitem__
+        )
+    
+    if st.button("🔍 검색"):
+        # 공백뿐인 검색어는 DB 조회/캐시 조회 없이 바로 넘김
+        if search_query.strip():
+            results = finder.search_captions(
+                search_query,
+                language_filter=language_filter if language_filter != "all" else None
+            )
             
-            for result in results:
-                video_id, title, channel, speaker, text, start_time, end_time, duration, language = result
-                
-                st.markdown(f"""
-                **🎤 {speaker}**: {text}
-                
-                📺 {title} | 📻 {channel} | ⏱️ {start_time}~{end_time}초 | 🌐 {language}
+            if not results.empty:
+                st.success(f"🎯 {len(results)}개 결과 발견!")
                 
-                [▶️ YouTube에서 보기](https://www.youtube.com/watch?v={video_id}&t={start_time}s)
-                
-                ---
-                """)
-        else:
-            st.warning("검색 결과가 없습니다.")
\ No newline at end of file
+                # 결과 전체를 한 번에 보내는 단일 표로 렌더링
+                st.dataframe(
+                    results,
+                    column_order=[
+                        'speaker', 'text', 'title', 'channel_name',
+                        'start_time', 'end_time', 'language', 'url'
+                    ],
+                    column_config={
+                        'speaker': '🎤 화자',
+                        'text': st.column_config.TextColumn('💬 자막', width='large'),
+                        'title': '📺 영상',
+                        'channel_name': '📻 채널',
+                        'start_time': st.column_config.NumberColumn('⏱️ 시작(초)'),
+                        'end_time': st.column_config.NumberColumn('끝(초)'),
+                        'language': '🌐 언어',
+                        'url': st.column_config.LinkColumn('▶️ YouTube', display_text='보기')
+                    },
+                    hide_index=True
+                )
+            else:
+                st.warning("검색 결과가 없습니다.")
+
+render_search(finder)